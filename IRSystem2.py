@@ -1,10 +1,10 @@
-import json
 import math
 import os
 import re
 import sys
 import heapq
 from PorterStemmer import PorterStemmer
+import instrument
 
 class IRSystem:
 
@@ -12,6 +12,7 @@ class IRSystem:
         self.titles = []
         self.docs = []
         self.vocab = []
+        self.impacts = None
         self.alphanum = re.compile('[^a-zA-Z0-9]')
         self.p = PorterStemmer()
 
@@ -80,13 +81,16 @@ class IRSystem:
             docs.append(contents)
         return titles, docs
 
+    @instrument.timed('read_data')
     def read_data(self, dirname):
         print ("Reading in documents...")
         filenames = os.listdir(dirname)
         subdirs = os.listdir(dirname)
         if 'stemmed' in subdirs:
+            instrument.count('stemmed_cache_hits')
             titles, docs = self.__read_stemmed_data(dirname)
         else:
+            instrument.count('stemmed_cache_misses')
             titles, docs = self.__read_raw_data(dirname)
         ordering = [idx for idx, title in sorted(enumerate(titles),
             key = lambda xx : xx[1])]
@@ -97,8 +101,12 @@ class IRSystem:
             self.titles.append(titles[ordering[d]])
             self.docs.append(docs[ordering[d]])
         self.vocab = [xx for xx in self.get_uniq_words()]
+        if instrument.ENABLED:
+            instrument.count('documents', numdocs)
+            instrument.count('tokens', sum(len(doc) for doc in self.docs))
 
-    def compute_tfidf(self):
+    @instrument.timed('compute_tfidf')
+    def compute_tfidf(self, impacts=False):
         print ("Calculating tf-idf...")
         self.tfidf = {}
         N = len(self.docs)
@@ -114,17 +122,26 @@ class IRSystem:
             for d,val in d_dict.items():
                 tfidf_l2norm2[d] = tfidf_l2norm2.get(d, 0.0) + val ** 2
         self.tfidf_l2norm = dict((k,math.sqrt(v)) for k,v in tfidf_l2norm2.items())               
+        self.impacts = None
+        if impacts:
+            self.compute_impacts()
+
+    def compute_impacts(self):
+        # per-term postings of tfidf/l2norm, highest impact first, for impact_retrieve
+        self.impacts = {}
+        for word, d_dict in self.tfidf.items():
+            self.impacts[word] = sorted(((val/self.tfidf_l2norm[d] if self.tfidf_l2norm[d] else 0.0, d)
+                for d,val in d_dict.items()),
+                reverse=True)
 
     def get_tfidf(self, word, document):
-        if self.tfidf[word][document] is not None: 
-            return self.tfidf[word][document]
-        else:
-            return 0
+        return self.tfidf.get(word, {}).get(document, 0.0)
 
     def get_tfidf_unstemmed(self, word, document):
         word = self.p.stem(word)
         return self.get_tfidf(word, document)
 
+    @instrument.timed('index')
     def index(self):
         print ("Indexing...")
         inv_index = {}
@@ -136,6 +153,8 @@ class IRSystem:
                     inv_index[word][i] = []
                 inv_index[word][i].append(j)
         self.inv_index = inv_index
+        if instrument.ENABLED:
+            instrument.count('postings', sum(len(d) for d in inv_index.values()))
 
     def get_posting(self, word):
         posting = self.inv_index[word].keys()
@@ -145,6 +164,7 @@ class IRSystem:
         word = self.p.stem(word)
         return self.get_posting(word)
 
+    @instrument.timed('boolean_retrieve')
     def boolean_retrieve(self, query):
         docs = []
         for d in range(len(self.docs)):
@@ -155,21 +175,82 @@ class IRSystem:
         docs = list(docsets)
         return docs   
 
+    @instrument.timed('rank_retrieve')
     def rank_retrieve(self, query):
+        if self.impacts is not None:
+            return self.impact_retrieve(query)
         scores = [0.0 for xx in range(len(self.docs))]
         wordvec = {}
         for word in query:
             wordvec[word] = wordvec.get(word,0) + 1
         wordvec = dict((word, math.log10(wordvec[word])+1.) for word in wordvec)
         def get_score(d):
-            d_vec = dict((word, self.tfidf[word].get(d,0.0)) for word in wordvec)    
+            d_vec = dict((word, self.tfidf.get(word,{}).get(d,0.0)) for word in wordvec)    
+            if not self.tfidf_l2norm[d]:
+                return 0.0
             return sum(wordvec[word] * d_vec[word] for word in d_vec)/self.tfidf_l2norm[d]
-            scores = []
+        scores = []
         for d in range(len(self.docs)):
             heapq.heappush(scores, (get_score(d), d))
         return [(k,v) for v,k in heapq.nlargest(10,scores)]
 
+    def impact_retrieve(self, query, k=10):
+        wordvec = {}
+        for word in query:
+            wordvec[word] = wordvec.get(word,0) + 1
+        wordvec = dict((word, math.log10(wordvec[word])+1.) for word in wordvec)
+        # term-at-a-time over impact lists, strongest terms first
+        terms = [word for word in wordvec if word in self.impacts and self.impacts[word][0][0] > 0]
+        terms.sort(key=lambda word: -wordvec[word]*self.impacts[word][0][0])
+        rest = sum(wordvec[word]*self.impacts[word][0][0] for word in terms)
+        acc = {}
+        theta = None
+        for word in terms:
+            qw = wordvec[word]
+            postings = self.impacts[word]
+            rest -= qw*postings[0][0]
+            if theta is None and len(acc) >= k:
+                theta = heapq.nlargest(k, acc.values())[-1]
+            pos = 0
+            for impact, d in postings:
+                if impact <= 0:
+                    break
+                if theta is not None and qw*impact + rest < theta:
+                    break
+                acc[d] = acc.get(d, 0.0) + qw*impact
+                pos += 1
+                if theta is None and len(acc) >= k:
+                    theta = heapq.nlargest(k, acc.values())[-1]
+            if pos < len(postings) and postings[pos][0] > 0:
+                # no new doc can reach the top k from this tail; only finish docs already seen
+                if len(acc) < len(postings) - pos:
+                    head = set(d for impact, d in postings[:pos])
+                    tfidf = self.tfidf[word]
+                    for d in acc:
+                        if d not in head and d in tfidf:
+                            acc[d] += qw*(tfidf[d]/self.tfidf_l2norm[d])
+                else:
+                    for impact, d in postings[pos:]:
+                        if d in acc:
+                            acc[d] += qw*impact
+            if len(acc) >= k:
+                theta = heapq.nlargest(k, acc.values())[-1]
+        def get_score(d):
+            return sum(wordvec[word]*self.tfidf[word].get(d,0.0) for word in wordvec
+                if word in self.tfidf)/self.tfidf_l2norm[d]
+        cands = heapq.nlargest(k, ((v,d) for d,v in acc.items()))
+        scores = [(get_score(d), d) for v,d in cands]
+        # docs that match no query term score 0, ordered as in rank_retrieve
+        d = len(self.docs) - 1
+        while len(scores) < k and d >= 0:
+            if d not in acc:
+                scores.append((0.0, d))
+            d -= 1
+        return [(d,v) for v,d in heapq.nlargest(k,scores)]
+
+    @instrument.timed('process_query')
     def process_query(self, query_str):
+        instrument.count('queries')
         query = query_str.lower()
         query = query.split()
         query = [self.alphanum.sub('', xx) for xx in query]
@@ -184,75 +265,19 @@ class IRSystem:
         query = self.process_query(query_str)
         return self.rank_retrieve(query)
 
-def run_tests(irsys):
+def run_tests(irsys, queries_path='../data/queries.txt', solutions_path='../data/solutions.txt'):
+    from eval_harness import LocalGrader, PART_NAMES, part_answers
     print ("===== Running tests =====")
-    ff = open('C:/Users/hp 850/Desktop/queries.txt')
-    questions = [xx.strip() for xx in ff.readlines()]
-    ff.close()
-    ff = open('C:/Users/hp 850/Desktop/solutions.txt')
-    solutions = [xx.strip() for xx in ff.readlines()]
-    ff.close()
-    epsilon = 1e-4
+    grader = LocalGrader(queries_path, solutions_path)
     for part in range(4):
-        points = 0
-        num_correct = 0
-        num_total = 0
-        prob = questions[part]
-        soln = json.loads(solutions[part])
-        if part == 0:     
-            print ("Inverted Index Test")
-            words = prob.split(", ")
-            for i, word in enumerate(words):
-                num_total += 1
-                posting = irsys.get_posting_unstemmed(word)
-                if set(posting) == set(soln[i]):
-                    num_correct += 1
-        elif part == 1:   
-            print ("Boolean Retrieval Test")
-            queries = prob.split(", ")
-            for i, query in enumerate(queries):
-                num_total += 1
-                guess = irsys.query_retrieve(query)
-                if set(guess) == set(soln[i]):
-                    num_correct += 1
-        elif part == 2:   
-            print ("TF-IDF Test")
-            queries = prob.split("; ")
-            queries = [xx.split(", ") for xx in queries]
-            queries = [(xx[0], int(xx[1])) for xx in queries]
-            for i, (word, doc) in enumerate(queries):
-                num_total += 1
-                guess = irsys.get_tfidf_unstemmed(word, doc)
-                if guess >= float(soln[i]) - epsilon and \
-                        guess <= float(soln[i]) + epsilon:
-                    num_correct += 1
-        elif part == 3:   
-            print ("Cosine Similarity Test")
-            queries = prob.split(", ")
-            for i, query in enumerate(queries):
-                num_total += 1
-                ranked = irsys.query_rank(query)
-                top_rank = ranked[0]
-                if top_rank[0] == soln[i][0]:
-                    if top_rank[1] >= float(soln[i][1]) - epsilon and \
-                            top_rank[1] <= float(soln[i][1]) + epsilon:
-                        num_correct += 1
-
-        feedback = "%d/%d Correct. Accuracy: %f" % \
-                (num_correct, num_total, float(num_correct)/num_total)
-        if num_correct == num_total:
-            points = 3
-        elif num_correct > 0.75 * num_total:
-            points = 2
-        elif num_correct > 0:
-            points = 1
-        else:
-            points = 0
+        print ("%s Test" % PART_NAMES[part])
+        answers = part_answers(irsys, part, grader.questions[part])
+        points, feedback = grader.grade_part(part, answers)
         print ("    Score: %d Feedback: %s" % (points, feedback))
 
 def main(args):
     irsys = IRSystem()
-    irsys.read_data('C:/Users/hp 850/Desktop/Data/RiderHaggard')
+    irsys.read_data('../data/RiderHaggard')
     irsys.index()
     irsys.compute_tfidf()
     if len(args) == 0:
@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+from IRSystem2 import IRSystem
+from PorterStemmer import PorterStemmer
+
+SCALES = [(60,500),(600,1000),(3000,2000)]
+
+def make_vocab(size,seed=0):
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    vocab = []
+    seen = set()
+    while len(vocab)<size:
+        word = ''.join(rng.choice(letters) for _ in range(rng.randint(3,10)))
+        if word not in seen:
+            seen.add(word)
+            vocab.append(word)
+    return vocab
+
+def zipf_cum_weights(n,s=1.1):
+    total = 0.0
+    cum = []
+    for rank in range(1,n+1):
+        total += 1.0/rank**s
+        cum.append(total)
+    return cum
+
+def make_corpus(n_docs,doc_len,vocab_size=20000,seed=0,line_len=12):
+    rng = random.Random(seed)
+    vocab = make_vocab(vocab_size,seed)
+    cum = zipf_cum_weights(vocab_size)
+    docs = []
+    for _ in range(n_docs):
+        words = rng.choices(vocab,cum_weights=cum,k=doc_len)
+        docs.append([' '.join(words[i:i+line_len]) for i in range(0,doc_len,line_len)])
+    return vocab,docs
+
+def write_corpus(dirname,docs):
+    os.mkdir('%s/raw' % dirname)
+    for i,lines in enumerate(docs):
+        f = open('%s/raw/doc%06d 1.txt' % (dirname,i),'w')
+        f.write('\n'.join(lines))
+        f.close()
+
+def make_model(vocab,dim=300,seed=0):
+    from compact_model import CompactVectors
+    rng = np.random.RandomState(seed)
+    vecs = rng.randn(len(vocab),dim).astype(np.float32)
+    vecs /= np.linalg.norm(vecs,axis=1,keepdims=True)
+    return CompactVectors(vocab,vecs,'float32')
+
+def proc_status_kb(field):
+    f = open('/proc/self/status')
+    try:
+        for line in f:
+            if line.startswith(field+':'):
+                return int(line.split()[1])
+    finally:
+        f.close()
+    return None
+
+def reset_peak_rss():
+    # Linux resets VmHWM to the current RSS when '5' is written to clear_refs
+    try:
+        f = open('/proc/self/clear_refs','w')
+        f.write('5')
+        f.close()
+        return proc_status_kb('VmHWM') is not None
+    except (IOError,OSError):
+        return False
+
+class Recorder:
+
+    # peak_kb is the memory a phase adds on top of what was resident when it started:
+    # peak RSS of the phase where Linux can reset it, else the tracemalloc peak
+    def __init__(self,trace_memory=False):
+        self.trace_memory = trace_memory or not reset_peak_rss()
+        self.results = []
+
+    def run(self,scale,phase,fn,ops=1):
+        if self.trace_memory:
+            tracemalloc.start()
+        else:
+            reset_peak_rss()
+            rss_start = proc_status_kb('VmRSS')
+        start = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter()-start
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]//1024
+            tracemalloc.stop()
+        else:
+            peak = proc_status_kb('VmHWM')-rss_start
+        self.results.append({'scale':scale,'phase':phase,'ops':ops,'seconds':elapsed,
+                             'us_per_op':1e6*elapsed/ops,'peak_kb':peak})
+        print ("    %-16s %10.4fs %12.2f us/op  peak %s KB" % (phase,elapsed,1e6*elapsed/ops,peak))
+        return out
+
+def quiet(fn):
+    def run():
+        out = sys.stdout
+        sys.stdout = open(os.devnull,'w')
+        try:
+            return fn()
+        finally:
+            sys.stdout.close()
+            sys.stdout = out
+    return run
+
+def bench_scale(rec,n_docs,doc_len,n_queries=200,seed=0,with_doc_sim=True):
+    scale = '%dx%d' % (n_docs,doc_len)
+    print ("Scale %s" % scale)
+    vocab,docs = make_corpus(n_docs,doc_len,seed=seed)
+    dirname = tempfile.mkdtemp(prefix='irbench')
+    try:
+        write_corpus(dirname,docs)
+        irsys = IRSystem()
+        rec.run(scale,'read_data',quiet(lambda: irsys.read_data(dirname)),n_docs)
+    finally:
+        shutil.rmtree(dirname)
+    n_tokens = sum(len(d) for d in irsys.docs)
+    rec.run(scale,'index',quiet(irsys.index),n_tokens)
+    rec.run(scale,'compute_tfidf',quiet(irsys.compute_tfidf),len(irsys.vocab))
+    rng = random.Random(seed)
+    terms = sorted(irsys.vocab)
+    queries = [rng.sample(terms,rng.randint(1,3)) for _ in range(n_queries)]
+    rec.run(scale,'boolean_retrieve',lambda: [irsys.boolean_retrieve(q) for q in queries],n_queries)
+    rec.run(scale,'rank_retrieve',lambda: [irsys.rank_retrieve(q) for q in queries],n_queries)
+    # terms in every document have idf 0 and are skipped by impact_retrieve, so leave them out
+    common = [xx for xx in sorted(terms,key=lambda xx: -len(irsys.inv_index[xx]))
+              if len(irsys.inv_index[xx]) < len(irsys.docs)][:50]
+    common_queries = [rng.sample(common,rng.randint(1,3)) for _ in range(n_queries)]
+    rec.run(scale,'rank_common',lambda: [irsys.rank_retrieve(q) for q in common_queries],n_queries)
+    rec.run(scale,'compute_impacts',irsys.compute_impacts)
+    rec.run(scale,'impact_retrieve',lambda: [irsys.rank_retrieve(q) for q in queries],n_queries)
+    rec.run(scale,'impact_common',lambda: [irsys.rank_retrieve(q) for q in common_queries],n_queries)
+    irsys.impacts = None
+    words = rng.choices(vocab,k=10000)
+    p = PorterStemmer()
+    rec.run(scale,'stem',lambda: [p.stem(w) for w in words],len(words))
+    if with_doc_sim:
+        from text_similarity import doc_sim
+        model = make_model(vocab)
+        # pair count follows n_docs and pair length follows doc_len, so the phase grows with the scale
+        n_pairs = 2*n_docs
+        pair_len = max(12,doc_len//10)
+        doc_words = [' '.join(d).split() for d in docs]
+        def window():
+            words = rng.choice(doc_words)
+            start = rng.randint(0,max(0,len(words)-pair_len))
+            return ' '.join(words[start:start+pair_len])
+        docs1 = [window() for _ in range(n_pairs)]
+        docs2 = [window() for _ in range(n_pairs)]
+        rec.run(scale,'doc_sim',quiet(lambda: doc_sim('en',docs1,docs2,model=model,stopwords=[])),n_pairs)
+
+def compare(old_path,new_path):
+    old = dict(((r['scale'],r['phase']),r) for r in json.load(open(old_path))['results'])
+    new = json.load(open(new_path))['results']
+    for r in new:
+        prev = old.get((r['scale'],r['phase']))
+        if prev is None:
+            continue
+        mem = ''
+        if prev['peak_kb'] is not None and r['peak_kb'] is not None:
+            mem = "  %10d -> %10d KB  x%.2f" % (prev['peak_kb'],r['peak_kb'],
+                float(r['peak_kb'])/max(prev['peak_kb'],1))
+        print ("%-12s %-16s %12.2f -> %12.2f us/op  x%.2f%s" % (r['scale'],r['phase'],prev['us_per_op'],
+               r['us_per_op'],r['us_per_op']/prev['us_per_op'],mem))
+
+def main(args):
+    if len(args)>0 and args[0]=='compare':
+        compare(args[1],args[2])
+        return
+    trace_memory = '--trace-memory' in args
+    scales = SCALES
+    if '--scales' in args:
+        spec = args[args.index('--scales')+1]
+        scales = [tuple(int(x) for x in xx.split('x')) for xx in spec.split(',')]
+        args = [xx for xx in args if xx!=spec]
+    paths = [xx for xx in args if not xx.startswith('--')]
+    out_path = paths[0] if len(paths)>0 else 'bench_output.json'
+    rec = Recorder(trace_memory)
+    for n_docs,doc_len in scales:
+        bench_scale(rec,n_docs,doc_len)
+    report = {'python':platform.python_version(),'platform':platform.platform(),
+              'trace_memory':rec.trace_memory,'time':time.strftime("%Y-%m-%d %H:%M:%S"),
+              'results':rec.results}
+    f = open(out_path,'w')
+    json.dump(report,f,indent=1)
+    f.close()
+    print ("Saved results to %s" % out_path)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
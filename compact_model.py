@@ -0,0 +1,117 @@
+import sys
+import codecs
+import numpy as np
+from text_similarity import LogInfo, PREPROCESS, load_model, load_stopwords, doc_sim
+
+class Vocab:
+    def __init__(self,index):
+        self.index = index
+
+class QuantizedMatrix:
+    # float16 rows, or int8 rows with one float32 scale per row; rows come back as float32
+    def __init__(self,data,scale=None):
+        self.data = data
+        self.scale = scale
+        self.shape = data.shape
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self,idx):
+        rows = np.asarray(self.data[idx],dtype=np.float32)
+        if self.scale is not None:
+            rows = rows*np.asarray(self.scale[idx])[...,None]
+        return rows
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes+(0 if self.scale is None else self.scale.nbytes)
+
+class CompactVectors:
+
+    def __init__(self,words,vectors,dtype='float16'):
+        assert dtype in ('float32','float16','int8'), 'Unknown dtype: '+dtype
+        self.index2word = list(words)
+        self.vocab = dict((word,Vocab(i)) for i,word in enumerate(self.index2word))
+        self.vector_size = vectors.shape[1]
+        self.dtype = dtype
+        vectors = np.asarray(vectors,dtype=np.float32)
+        if dtype=='int8':
+            scale = np.abs(vectors).max(axis=1)/127.
+            scale[scale==0] = 1.0
+            data = np.round(vectors/scale[:,None]).astype(np.int8)
+            self.vectors = QuantizedMatrix(data,scale.astype(np.float32))
+        else:
+            self.vectors = QuantizedMatrix(vectors.astype(dtype))
+
+    def __contains__(self,word):
+        return word in self.vocab
+
+    def __getitem__(self,words):
+        if isinstance(words,str):
+            return self.vectors[self.vocab[words].index]
+        return self.vectors[[self.vocab[word].index for word in words]]
+
+    def save(self,prefix):
+        np.save(prefix+'.vectors.npy',self.vectors.data)
+        if self.vectors.scale is not None:
+            np.save(prefix+'.scale.npy',self.vectors.scale)
+        with codecs.open(prefix+'.vocab.txt','w',encoding='utf-8') as f:
+            for word in self.index2word:
+                f.write(word+'\n')
+
+def load_compact(prefix,mmap=True):
+    LogInfo('Load compact model '+prefix+'...')
+    mode = 'r' if mmap else None
+    with codecs.open(prefix+'.vocab.txt','r',encoding='utf-8') as f:
+        words = [w.rstrip('\n') for w in f]
+    data = np.load(prefix+'.vectors.npy',mmap_mode=mode)
+    model = CompactVectors.__new__(CompactVectors)
+    model.index2word = words
+    model.vocab = dict((word,Vocab(i)) for i,word in enumerate(words))
+    model.vector_size = data.shape[1]
+    if data.dtype==np.int8:
+        model.dtype = 'int8'
+        model.vectors = QuantizedMatrix(data,np.load(prefix+'.scale.npy',mmap_mode=mode))
+    else:
+        model.dtype = str(data.dtype)
+        model.vectors = QuantizedMatrix(data)
+    return model
+
+def corpus_vocab(lang,docs,stopwords=None):
+    if stopwords is None:
+        stopwords = load_stopwords(lang)
+    preprocess_data = PREPROCESS[lang]
+    vocab = set()
+    for doc in docs:
+        vocab.update(preprocess_data(stopwords,doc))
+    return vocab
+
+def prune_model(model,vocab,top_n=50000,dtype='float16'):
+    # gensim keeps index2word sorted by descending frequency
+    keep = list(model.index2word[:top_n])
+    seen = set(keep)
+    keep.extend(sorted(word for word in vocab if word in model.vocab and word not in seen))
+    vectors = model.vectors[[model.vocab[word].index for word in keep]]
+    compact = CompactVectors(keep,vectors,dtype)
+    LogInfo('Pruned %d -> %d words, %.1f MB -> %.1f MB' % (len(model.vocab),len(keep),
+            model.vectors.nbytes/2.**20,compact.vectors.nbytes/2.**20))
+    return compact
+
+def max_score_error(lang,full,compact,docs1,docs2):
+    sims_full = np.array(doc_sim(lang,docs1,docs2,model=full))
+    sims_compact = np.array(doc_sim(lang,docs1,docs2,model=compact))
+    return float(np.max(np.abs(sims_full-sims_compact)))
+
+def main(args):
+    lang,corpus_path,prefix = args[:3]
+    top_n = int(args[3]) if len(args)>3 else 50000
+    dtype = args[4] if len(args)>4 else 'float16'
+    docs = codecs.open(corpus_path,'r',encoding='utf-8').read().splitlines()
+    model = load_model(lang)
+    compact = prune_model(model,corpus_vocab(lang,docs),top_n,dtype)
+    compact.save(prefix)
+    LogInfo('Save compact model as: '+prefix)
+
+if __name__=='__main__':
+    main(sys.argv[1:])
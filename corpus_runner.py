@@ -0,0 +1,134 @@
+import os
+import sys
+import json
+import hashlib
+import multiprocessing
+import pandas as pd
+import instrument
+from gensim.models import KeyedVectors
+from text_similarity import LogInfo, PREPROCESS, load_model, load_stopwords, pair_sims, regularize_sim
+from stream_similarity import read_table
+
+CORPUS_CN = ['baidu_003_02','weixin_003_02','ifly_003_02',
+             'baidu_008','weixin_008','ifly_008',
+             'baidu_006_01','weixin_006_01', 'ifly_006_01',
+             'baidu_004','weixin_004', 'ifly_004',
+             'baidu_004_02','weixin_004_02','ifly_004_02',
+             'baidu_rePunct_huiting','weixin_rePunct_huiting', 'ifly_rePunct_huiting']
+
+_worker = {}
+
+def default_manifest():
+    return {'lang':'cn',
+            'model':'../model/cn.cbow.kv',
+            'output_dir':'../res',
+            'corpora':[{'name':c,'input':'../data/'+c+'.txt'} for c in CORPUS_CN]}
+
+def load_manifest(path):
+    with open(path) as f:
+        return json.load(f)
+
+def file_digest(path):
+    sha1 = hashlib.sha1()
+    with open(path,'rb') as f:
+        for block in iter(lambda: f.read(1<<20),b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def prepare_shared_model(lang,path):
+    # one-off conversion so every worker can mmap the same vectors
+    if not os.path.exists(path):
+        model = load_model(lang)
+        LogInfo('Save shared model as: '+path)
+        model.save(path)
+
+def init_worker(lang,model_path):
+    _worker['model'] = KeyedVectors.load(model_path,mmap='r')
+    _worker['stopwords'] = load_stopwords(lang)
+    _worker['preprocess'] = PREPROCESS[lang]
+
+def score_corpus(job):
+    name,input_path,output_path = job
+    LogInfo(name+' start')
+    data = read_table(input_path,'\t',('id','REF','HYP'))
+    docs1 = data.REF.values
+    docs2 = data.HYP.values
+    sims = pair_sims(_worker['model'],_worker['stopwords'],_worker['preprocess'],docs1,docs2)
+    res = pd.DataFrame(columns=['id','REF','HYP','semantic_similarity','SER','WER','difference'])
+    res.id = data.id
+    res.REF = docs1
+    res.HYP = docs2
+    res.WER = data.WER
+    res.semantic_similarity = regularize_sim(sims)
+    res.SER = 1-res.semantic_similarity
+    res.difference = res.SER-res.WER
+    if output_path.endswith('.xlsx'):
+        res.to_excel(output_path,index=0)
+    else:
+        res.to_csv(output_path,index=0,encoding='utf-8')
+    LogInfo(name+' finish')
+    return name,{'rows':len(res),
+                 'SER':float(res.SER.sum()),
+                 'WER':float(res.WER.sum()),
+                 'difference':float(res.difference.sum())}
+
+def summarize(stats):
+    rows = []
+    for name,s in sorted(stats.items()):
+        rows.append({'engine':name.split('_')[0],'corpus':name,'rows':s['rows'],
+                     'SER':s['SER'],'WER':s['WER'],'difference':s['difference']})
+    table = pd.DataFrame(rows,columns=['engine','corpus','rows','SER','WER','difference'])
+    summary = table.groupby('engine')[['rows','SER','WER','difference']].sum()
+    for col in ['SER','WER','difference']:
+        summary[col] = summary[col]/summary['rows']
+    return summary.reset_index()
+
+def run(manifest,processes=None,force=False):
+    lang = manifest['lang']
+    output_dir = manifest.get('output_dir','../res')
+    state_path = os.path.join(output_dir,'runner_state.json')
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+    jobs = []
+    digests = {}
+    for c in manifest['corpora']:
+        name = c['name']
+        output_path = c.get('output',os.path.join(output_dir,name+'_w2v09.csv'))
+        digests[name] = file_digest(c['input'])
+        prev = state.get(name)
+        # outputs are only reusable if input, language and model are all unchanged
+        if not force and prev is not None and prev['digest']==digests[name] and \
+                prev.get('lang')==lang and prev.get('model')==manifest['model'] and os.path.exists(output_path):
+            LogInfo(name+' unchanged, skipped')
+            instrument.count('corpus_cache_hits')
+            continue
+        jobs.append((name,c['input'],output_path))
+    if len(jobs)>0:
+        prepare_shared_model(lang,manifest['model'])
+        processes = min(processes or multiprocessing.cpu_count(),len(jobs))
+        pool = multiprocessing.Pool(processes,initializer=init_worker,initargs=(lang,manifest['model']))
+        try:
+            for name,stats in pool.imap_unordered(score_corpus,jobs):
+                stats['digest'] = digests[name]
+                stats['lang'] = lang
+                stats['model'] = manifest['model']
+                state[name] = stats
+                with open(state_path,'w') as f:
+                    json.dump(state,f,indent=1)
+        finally:
+            pool.close()
+            pool.join()
+    names = set(c['name'] for c in manifest['corpora'])
+    summary = summarize(dict((k,v) for k,v in state.items() if k in names))
+    summary_path = os.path.join(output_dir,'summary.csv')
+    summary.to_csv(summary_path,index=0)
+    LogInfo('Save summary as: '+summary_path)
+    print(summary.to_string(index=False))
+    return summary
+
+if __name__=='__main__':
+    args = sys.argv[1:]
+    manifest = load_manifest(args[0]) if len(args)>0 else default_manifest()
+    run(manifest,processes=int(args[1]) if len(args)>1 else None)
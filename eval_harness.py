@@ -0,0 +1,146 @@
+import os
+import sys
+import ast
+import json
+import pickle
+import hashlib
+from IRSystem2 import IRSystem
+
+PART_TYPES = {1:0, 2:0, 3:1, 4:1, 5:2, 6:2, 7:3, 8:3}
+PART_NAMES = ['Inverted Index', 'Boolean Retrieval', 'TF-IDF', 'Cosine Similarity']
+SPLITS = {0:", ", 1:", ", 2:"; ", 3:", "}
+
+def data_digest(dirname):
+    # the corpus a cached index was built from: path plus name and contents of every source file
+    sha1 = hashlib.sha1(os.path.abspath(dirname).encode('utf-8'))
+    subdir = 'raw' if os.path.isdir('%s/raw' % dirname) else 'stemmed'
+    for filename in sorted(os.listdir('%s/%s' % (dirname, subdir))):
+        sha1.update(('%s/%s\n' % (subdir, filename)).encode('utf-8'))
+        f = open('%s/%s/%s' % (dirname, subdir, filename), 'rb')
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+        f.close()
+    return sha1.hexdigest()
+
+def build_index(dirname, cache=None):
+    digest = data_digest(dirname)
+    if cache is not None and os.path.exists(cache):
+        f = open(cache, 'rb')
+        cached = pickle.load(f)
+        f.close()
+        if cached.get('digest') == digest:
+            print ("Loading index from %s" % cache)
+            return cached['irsys']
+        print ("Index cache %s was built from other data, rebuilding" % cache)
+    irsys = IRSystem()
+    irsys.read_data(dirname)
+    irsys.index()
+    irsys.compute_tfidf(impacts=True)
+    if cache is not None:
+        f = open(cache, 'wb')
+        pickle.dump({'digest': digest, 'irsys': irsys}, f, pickle.HIGHEST_PROTOCOL)
+        f.close()
+    return irsys
+
+def part_answers(irsys, part, ch_aux):
+    queries = ch_aux.split(SPLITS[part])
+    if part == 0:
+        return [list(irsys.get_posting_unstemmed(query)) for query in queries]
+    elif part == 1:
+        return [list(irsys.query_retrieve(query)) for query in queries]
+    elif part == 2:
+        queries = [query.split(", ") for query in queries]
+        return [irsys.get_tfidf_unstemmed(word, int(docID)) for word, docID in queries]
+    else:
+        return [list(irsys.query_rank(query)[0]) for query in queries]
+
+def format_output(partId, answers):
+    version = 1
+    output = [partId, version]
+    output.extend(answers)
+    return str(output)
+
+def part_output(irsys, partId, ch_aux):
+    if partId not in PART_TYPES:
+        print ("Unknown partId: %d" % partId)
+        return None
+    return format_output(partId, part_answers(irsys, PART_TYPES[partId], ch_aux))
+
+def all_outputs(irsys, challenges):
+    # Dev and Test parts sharing a query set are answered once
+    answers = {}
+    outputs = {}
+    for partId, ch_aux in sorted(challenges.items()):
+        key = (PART_TYPES[partId], ch_aux)
+        if key not in answers:
+            answers[key] = part_answers(irsys, key[0], ch_aux)
+        outputs[partId] = format_output(partId, answers[key])
+    return outputs
+
+class LocalGrader:
+    # stands in for the nlp-class challenge/submit endpoints using queries.txt and solutions.txt
+
+    def __init__(self, queries_path, solutions_path, epsilon=1e-4):
+        f = open(queries_path)
+        self.questions = [xx.strip() for xx in f.readlines()]
+        f.close()
+        f = open(solutions_path)
+        self.solutions = [json.loads(xx.strip()) for xx in f.readlines() if xx.strip()]
+        f.close()
+        self.epsilon = epsilon
+
+    def challenges(self):
+        return dict((partId, self.questions[part]) for partId, part in PART_TYPES.items())
+
+    def close(self, guess, soln):
+        return guess >= float(soln) - self.epsilon and guess <= float(soln) + self.epsilon
+
+    def grade(self, partId, output):
+        return self.grade_part(PART_TYPES[partId], ast.literal_eval(output)[2:])
+
+    def grade_part(self, part, answers):
+        soln = self.solutions[part]
+        num_correct = 0
+        for i, guess in enumerate(answers):
+            if part == 0 or part == 1:
+                ok = set(guess) == set(soln[i])
+            elif part == 2:
+                ok = self.close(guess, soln[i])
+            else:
+                ok = guess[0] == soln[i][0] and self.close(guess[1], soln[i][1])
+            if ok:
+                num_correct += 1
+        num_total = len(answers)
+        if num_correct == num_total:
+            points = 3
+        elif num_correct > 0.75 * num_total:
+            points = 2
+        elif num_correct > 0:
+            points = 1
+        else:
+            points = 0
+        feedback = "%d/%d Correct. Accuracy: %f" % \
+                (num_correct, num_total, float(num_correct)/num_total)
+        return points, feedback
+
+def evaluate(dirname, queries_path, solutions_path, cache=None):
+    grader = LocalGrader(queries_path, solutions_path)
+    irsys = build_index(dirname, cache)
+    outputs = all_outputs(irsys, grader.challenges())
+    total = 0
+    for partId in sorted(outputs):
+        points, feedback = grader.grade(partId, outputs[partId])
+        total += points
+        print ("Part %d %s %s - Score: %d Feedback: %s" % (partId, PART_NAMES[PART_TYPES[partId]],
+            'Dev' if partId % 2 else 'Test', points, feedback))
+    print ("Total: %d/%d" % (total, 3 * len(outputs)))
+    return outputs
+
+def main(args):
+    if len(args) < 3:
+        print ("Usage: python eval_harness.py <data dir> <queries.txt> <solutions.txt> [index cache]")
+        return
+    evaluate(args[0], args[1], args[2], args[3] if len(args) > 3 else None)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import time
+import threading
+
+# off unless IR_INSTRUMENT is set (or enable() is called); disabled spans are a shared no-op
+ENABLED = os.environ.get('IR_INSTRUMENT','') not in ('','0')
+PREFIX = 'nlp'
+
+spans = {}
+counters = {}
+_log = None
+_lock = threading.Lock()
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+    def __exit__(self,*exc):
+        return False
+
+_NULL = _NullSpan()
+
+class _Span:
+
+    def __init__(self,name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self,*exc):
+        elapsed = time.perf_counter()-self.start
+        with _lock:
+            s = spans.get(self.name)
+            if s is None:
+                s = spans[self.name] = {'count':0,'sum':0.0,'max':0.0}
+            s['count'] += 1
+            s['sum'] += elapsed
+            if elapsed>s['max']:
+                s['max'] = elapsed
+        if _log is not None:
+            _log.write(json.dumps({'ts':time.time(),'span':self.name,'seconds':elapsed})+'\n')
+            _log.flush()
+        return False
+
+def enable(flag=True,log=None):
+    global ENABLED, _log
+    ENABLED = flag
+    if log is not None:
+        _log = open(log,'a') if isinstance(log,str) else log
+
+def reset():
+    with _lock:
+        spans.clear()
+        counters.clear()
+
+def span(name):
+    if not ENABLED:
+        return _NULL
+    return _Span(name)
+
+def timed(name):
+    def wrap(fn):
+        def run(*args,**kwargs):
+            if not ENABLED:
+                return fn(*args,**kwargs)
+            with _Span(name):
+                return fn(*args,**kwargs)
+        run.__name__ = fn.__name__
+        run.__doc__ = fn.__doc__
+        return run
+    return wrap
+
+def count(name,n=1):
+    if ENABLED:
+        with _lock:
+            counters[name] = counters.get(name,0)+n
+
+def peak_rss_kb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return None
+
+def snapshot():
+    with _lock:
+        return {'spans':dict((k,dict(v)) for k,v in spans.items()),
+                'counters':dict(counters),
+                'peak_rss_kb':peak_rss_kb()}
+
+def log_snapshot(stream=None):
+    stream = stream or _log or sys.stderr
+    stream.write(json.dumps(dict(snapshot(),ts=time.time()))+'\n')
+    stream.flush()
+
+def prometheus_text():
+    snap = snapshot()
+    lines = ['# TYPE %s_span_seconds summary' % PREFIX]
+    for name,s in sorted(snap['spans'].items()):
+        lines.append('%s_span_seconds_count{span="%s"} %d' % (PREFIX,name,s['count']))
+        lines.append('%s_span_seconds_sum{span="%s"} %.9f' % (PREFIX,name,s['sum']))
+    lines.append('# TYPE %s_span_seconds_max gauge' % PREFIX)
+    for name,s in sorted(snap['spans'].items()):
+        lines.append('%s_span_seconds_max{span="%s"} %.9f' % (PREFIX,name,s['max']))
+    for name,v in sorted(snap['counters'].items()):
+        lines.append('# TYPE %s_%s_total counter' % (PREFIX,name))
+        lines.append('%s_%s_total %d' % (PREFIX,name,v))
+    if snap['peak_rss_kb'] is not None:
+        lines.append('# TYPE %s_peak_rss_bytes gauge' % PREFIX)
+        lines.append('%s_peak_rss_bytes %d' % (PREFIX,snap['peak_rss_kb']*1024))
+    return '\n'.join(lines)+'\n'
+
+def serve(port=9100,host='127.0.0.1'):
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path!='/metrics':
+                self.send_error(404)
+                return
+            body = prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type','text/plain; version=0.0.4')
+            self.send_header('Content-Length',str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self,*args):
+            pass
+
+    server = HTTPServer((host,port),Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+if os.environ.get('IR_INSTRUMENT_LOG'):
+    enable(ENABLED,os.environ['IR_INSTRUMENT_LOG'])
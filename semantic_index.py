@@ -0,0 +1,175 @@
+import sys
+import time
+import numpy as np
+from text_similarity import LogInfo, PREPROCESS, load_model, load_stopwords, embed_docs
+
+def normalize(vecs):
+    norms = np.linalg.norm(vecs,axis=1,keepdims=True)
+    norms[norms==0] = 1.0
+    return vecs/norms
+
+def cos_to_sim(cos):
+    # same angular similarity as calculate_similarity
+    return 1-np.arccos(np.clip(cos,-1.0,1.0))/np.pi
+
+def topk(scores,ids,k):
+    if ids.ndim==1:
+        ids = np.broadcast_to(ids,scores.shape)
+    if scores.shape[1]>k:
+        part = np.argpartition(-scores,k-1,axis=1)[:,:k]
+        scores = np.take_along_axis(scores,part,axis=1)
+        ids = np.take_along_axis(ids,part,axis=1)
+    order = np.argsort(-scores,axis=1,kind='stable')
+    return np.take_along_axis(scores,order,axis=1),np.take_along_axis(ids,order,axis=1)
+
+class SemanticIndex:
+
+    def __init__(self,lang,model=None,pooling=None,block_size=1024,ann_threshold=100000,n_lists=None,n_probe=8):
+        self.lang = lang
+        self.model = model
+        self.pooling = pooling
+        self.stopwords = None
+        self.block_size = block_size
+        self.ann_threshold = ann_threshold
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.vectors = None
+        self.ids = None
+        self.centroids = None
+        self.lists = None
+
+    def embed(self,docs):
+        if self.model is None:
+            self.model = load_model(self.lang)
+        if self.stopwords is None:
+            self.stopwords = load_stopwords(self.lang)
+        preprocess_data = PREPROCESS[self.lang]
+        docs = [preprocess_data(self.stopwords,doc) for doc in docs]
+        vecs,mask = embed_docs(self.model,docs,self.pooling)
+        return normalize(vecs),mask
+
+    def build(self,docs):
+        LogInfo('Embedding %d documents...' % len(docs))
+        vecs,mask = self.embed(docs)
+        self.build_vectors(vecs[mask],np.nonzero(mask)[0])
+
+    def build_vectors(self,vecs,ids=None):
+        self.vectors = np.ascontiguousarray(normalize(np.asarray(vecs,dtype=np.float32)))
+        self.ids = np.arange(len(vecs)) if ids is None else np.asarray(ids)
+        self.centroids = None
+        self.lists = None
+        if len(self.vectors)>=self.ann_threshold:
+            self.train_ivf()
+
+    def train_ivf(self,n_iter=10,seed=0):
+        n = len(self.vectors)
+        if n==0:
+            return
+        n_lists = self.n_lists or max(1,int(np.sqrt(n)))
+        rng = np.random.RandomState(seed)
+        sample = self.vectors[rng.choice(n,min(n,n_lists*64),replace=False)]
+        n_lists = min(n_lists,len(sample))
+        LogInfo('Training IVF with %d lists over %d vectors...' % (n_lists,n))
+        centroids = sample[rng.choice(len(sample),n_lists,replace=False)].copy()
+        for _ in range(n_iter):
+            assign = np.argmax(sample.dot(centroids.T),axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums,assign,sample)
+            counts = np.bincount(assign,minlength=n_lists)
+            filled = counts>0
+            centroids[filled] = sums[filled]/counts[filled][:,None]
+            centroids = normalize(centroids)
+        assign = np.concatenate([np.argmax(self.vectors[s:s+self.block_size].dot(centroids.T),axis=1)
+                                 for s in range(0,n,self.block_size)])
+        order = np.argsort(assign,kind='stable')
+        bounds = np.searchsorted(assign[order],np.arange(n_lists+1))
+        self.centroids = centroids
+        self.lists = [order[bounds[c]:bounds[c+1]] for c in range(n_lists)]
+
+    def exact_search(self,Q,k):
+        k = min(k,len(self.vectors))
+        res_s = []
+        res_i = []
+        for qs in range(0,len(Q),self.block_size):
+            q = Q[qs:qs+self.block_size]
+            best_s = np.zeros((len(q),0),dtype=np.float32)
+            best_i = np.zeros((len(q),0),dtype=np.int64)
+            for s in range(0,len(self.vectors),self.block_size):
+                block = self.vectors[s:s+self.block_size]
+                ids = np.broadcast_to(np.arange(s,s+len(block)),(len(q),len(block)))
+                best_s,best_i = topk(np.hstack([best_s,q.dot(block.T)]),np.hstack([best_i,ids]),k)
+            res_s.append(best_s)
+            res_i.append(best_i)
+        return np.vstack(res_s),np.vstack(res_i)
+
+    def ivf_search(self,Q,k):
+        k = min(k,len(self.vectors))
+        n_probe = min(self.n_probe,len(self.lists))
+        probe = np.argpartition(-Q.dot(self.centroids.T),n_probe-1,axis=1)[:,:n_probe]
+        res_s = np.full((len(Q),k),-1.0,dtype=np.float32)
+        res_i = np.full((len(Q),k),-1,dtype=np.int64)
+        for i,q in enumerate(Q):
+            cand = np.concatenate([self.lists[c] for c in probe[i]])
+            if len(cand)==0:
+                continue
+            s,ids = topk(self.vectors[cand].dot(q)[None,:],cand,k)
+            res_s[i,:s.shape[1]] = s[0]
+            res_i[i,:s.shape[1]] = ids[0]
+        return res_s,res_i
+
+    def search_vectors(self,Q,k=10,exact=None):
+        Q = normalize(np.asarray(Q,dtype=np.float32))
+        if exact is None:
+            exact = self.lists is None
+        if not exact and self.lists is None:
+            self.train_ivf()
+        # an empty index has no IVF lists, exact search returns empty results
+        if exact or self.lists is None:
+            return self.exact_search(Q,k)
+        return self.ivf_search(Q,k)
+
+    def search(self,docs,k=10,exact=None):
+        vecs,mask = self.embed(docs)
+        results = [[] for _ in docs]
+        if not mask.any():
+            return results
+        scores,idx = self.search_vectors(vecs[mask],k,exact)
+        sims = cos_to_sim(scores)
+        for row,i in enumerate(np.nonzero(mask)[0]):
+            results[i] = [(int(self.ids[j]),float(sim)) for j,sim in zip(idx[row],sims[row]) if j>=0]
+        return results
+
+    def similarity_matrix(self,docs1,docs2=None):
+        vecs1,mask1 = self.embed(docs1)
+        if docs2 is None:
+            vecs2,mask2 = vecs1,mask1
+        else:
+            vecs2,mask2 = self.embed(docs2)
+        sims = cos_to_sim(vecs1.dot(vecs2.T))
+        sims[~mask1,:] = -1
+        sims[:,~mask2] = -1
+        return sims
+
+def benchmark(n_docs=200000,dim=300,n_queries=200,k=10,n_probes=(1,4,8,16,32),seed=0):
+    rng = np.random.RandomState(seed)
+    n_clusters = max(1,n_docs//500)
+    centers = rng.randn(n_clusters,dim).astype(np.float32)
+    docs = centers[rng.randint(n_clusters,size=n_docs)]+0.5*rng.randn(n_docs,dim).astype(np.float32)
+    queries = centers[rng.randint(n_clusters,size=n_queries)]+0.5*rng.randn(n_queries,dim).astype(np.float32)
+    index = SemanticIndex(None,ann_threshold=0)
+    start = time.time()
+    index.build_vectors(docs)
+    LogInfo('Build: %.2fs' % (time.time()-start))
+    start = time.time()
+    _,truth = index.search_vectors(queries,k,exact=True)
+    LogInfo('Exact: %.3f ms/query' % (1000*(time.time()-start)/n_queries))
+    for n_probe in n_probes:
+        index.n_probe = n_probe
+        start = time.time()
+        _,found = index.search_vectors(queries,k,exact=False)
+        elapsed = 1000*(time.time()-start)/n_queries
+        recall = np.mean([len(set(t)&set(f))/float(k) for t,f in zip(truth,found)])
+        LogInfo('IVF n_probe=%d: %.3f ms/query, recall@%d %.4f' % (n_probe,elapsed,k,recall))
+
+if __name__=='__main__':
+    benchmark(*[int(x) for x in sys.argv[1:3]])
@@ -0,0 +1,110 @@
+import os
+import sys
+import pandas as pd
+from text_similarity import LogInfo, PREPROCESS, load_model, load_stopwords, pair_sims
+
+def output_format(path):
+    return 'parquet' if path.endswith('.parquet') else 'csv'
+
+class ChunkWriter:
+
+    def __init__(self,path):
+        self.path = path
+        self.fmt = output_format(path)
+        self.writer = None
+        self.schema = None
+        self.rows = 0
+        if os.path.exists(path):
+            os.remove(path)
+
+    def write(self,chunk):
+        if self.fmt=='parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # pandas infers types per chunk, so later chunks are cast to the first one's schema
+            table = pa.Table.from_pandas(chunk,schema=self.schema,preserve_index=False)
+            if self.writer is None:
+                self.schema = table.schema
+                self.writer = pq.ParquetWriter(self.path,self.schema)
+            self.writer.write_table(table)
+        else:
+            chunk.to_csv(self.path,mode='a',header=self.rows==0,index=False,encoding='utf-8')
+        self.rows += len(chunk)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+def csv_reader(path,sep,text_cols,chunksize=None):
+    # text columns stay strings: blank REF stays '', ids like 0001 keep their padding
+    columns = pd.read_csv(path,sep=sep,nrows=0,encoding='utf-8').columns
+    dtype = dict((col,str) for col in text_cols if col in columns)
+    return pd.read_csv(path,sep=sep,chunksize=chunksize,encoding='utf-8',
+                       dtype=dtype,keep_default_na=False)
+
+def numeric_wer(chunk):
+    if 'WER' in chunk.columns:
+        chunk['WER'] = pd.to_numeric(chunk['WER'],errors='coerce')
+    return chunk
+
+def read_table(path,sep=',',text_cols=()):
+    return numeric_wer(csv_reader(path,sep,text_cols))
+
+def read_chunks(path,chunksize,sep=',',text_cols=()):
+    if output_format(path)=='parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        for chunk in csv_reader(path,sep,text_cols,chunksize):
+            yield numeric_wer(chunk)
+
+def stream_doc_sim(lang,input_path,output_path,model=None,chunksize=10000,sep='\t',
+                   col1='REF',col2='HYP'):
+    assert lang=='cn' or lang=='en', 'Language setting is wrong'
+    preprocess_data = PREPROCESS[lang]
+    if model is None:
+        model = load_model(lang)
+    stopwords = load_stopwords(lang)
+    part_path = output_path+'.part.'+output_format(output_path)
+    text_cols = ('id',col1,col2)
+    # pass 1: score chunk by chunk, keep -1 for missing representations
+    LogInfo('Calculating similarity...')
+    writer = ChunkWriter(part_path)
+    total = 0.0
+    count = 0
+    errors = 0
+    for chunk in read_chunks(input_path,chunksize,sep,text_cols):
+        docs1 = chunk[col1].values
+        docs2 = chunk[col2].values
+        sims = pair_sims(model,stopwords,preprocess_data,docs1,docs2)
+        for sim in sims:
+            if sim==-1:
+                errors += 1
+            else:
+                total += sim
+                count += 1
+        chunk['semantic_similarity'] = pd.Series(sims,index=chunk.index,dtype='float64')
+        writer.write(chunk)
+        LogInfo('Scored %d rows' % writer.rows)
+    writer.close()
+    LogInfo('Errors: '+str(errors))
+    # pass 2: fill the -1 gaps with the mean and derive SER/difference
+    sim_mean = total/count if count>0 else float('nan')
+    writer = ChunkWriter(output_path)
+    for chunk in read_chunks(part_path,chunksize,text_cols=text_cols):
+        sims = chunk['semantic_similarity']
+        chunk['semantic_similarity'] = sims.where(sims!=-1,sim_mean)
+        if 'WER' in chunk.columns:
+            chunk['SER'] = 1-chunk['semantic_similarity']
+            chunk['difference'] = chunk['SER']-chunk['WER']
+        writer.write(chunk)
+    writer.close()
+    os.remove(part_path)
+    LogInfo('Save result as: '+output_path)
+    return writer.rows
+
+if __name__=='__main__':
+    args = sys.argv[1:]
+    stream_doc_sim(args[0],args[1],args[2],chunksize=int(args[3]) if len(args)>3 else 10000)
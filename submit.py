@@ -160,44 +160,20 @@ def source(partId):
     return src
 
 from IRSystem import IRSystem
+from eval_harness import part_output
+_irsys = None
 def output(partId, ch_aux):
-    version = 1
-    output = [partId, version]
-    irsys = IRSystem()
-    irsys.read_data('C:/Users/hp 850/Desktop/Data/RiderHaggard')
-    irsys.index()
-    irsys.compute_tfidf()
+    global _irsys
+    if _irsys is None:
+        _irsys = IRSystem()
+        _irsys.read_data('C:/Users/hp 850/Desktop/Data/RiderHaggard')
+        _irsys.index()
+        _irsys.compute_tfidf()
     out = sys.stdout
     if partId in [2,4,6,8]:   
         sys.stdout = open(os.devnull, 'w')
-    if partId == 1 or partId == 2:
-        queries = ch_aux.split(", ")
-        for query in queries:
-            posting = irsys.get_posting_unstemmed(query)
-            output.append(list(posting))
-    elif partId == 3 or partId == 4:
-        queries = ch_aux.split(", ")
-        for query in queries:
-            result = irsys.query_retrieve(query)
-            result = list(result)
-            output.append(result)
-    elif partId == 5 or partId == 6:
-        queries = ch_aux.split("; ")
-        for query in queries:
-            word, docID = query.split(", ")
-            result = irsys.get_tfidf_unstemmed(word, int(docID));
-            output.append(result)
-    elif partId == 7 or partId == 8:
-        queries = ch_aux.split(", ")
-        for query in queries:
-            results = irsys.query_rank(query)
-            first_result = [results[0][0], results[0][1]]
-            output.append(first_result)
-    else:
-        print ("Unknown partId: %d" % partId)
-        return None
+    output = part_output(_irsys, partId, ch_aux)
     if partId in [2,4,6,8]:   
         sys.stdout = out
-    output = str(output)
     return output
 submit(0)
\ No newline at end of file
@@ -3,10 +3,12 @@ import jieba
 import re
 import codecs
 import time
+import json
 import pandas as pd
 from gensim.models import Word2Vec,KeyedVectors
 from sklearn.metrics.pairwise import cosine_similarity
 from nltk import word_tokenize
+import instrument
 
 def LogInfo(stri):
     print(str(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))+'  '+stri)
@@ -27,6 +29,80 @@ def doc_vector(model,doc):
     doc = [word for word in doc if word in model.vocab]
     return np.mean(model[doc],axis=0)
 
+def idf_weights(docs):
+    df = {}
+    for doc in docs:
+        for word in set(doc):
+            df[word] = df.get(word,0) + 1
+    N = len(docs)
+    weights = dict((word,np.log((N+1.)/(n+1.))+1.) for word,n in df.items())
+    return weights,np.log(N+1.)+1.
+
+def sif_weights(docs,a=1e-3):
+    counts = {}
+    for doc in docs:
+        for word in doc:
+            counts[word] = counts.get(word,0) + 1
+    total = float(sum(counts.values()))
+    weights = dict((word,a/(a+n/total)) for word,n in counts.items())
+    return weights,1.0
+
+def build_pooling(model,ref_docs,mode='sif',a=1e-3):
+    assert mode in ('mean','idf','sif'), 'Pooling mode is wrong'
+    if mode=='mean':
+        return None
+    if mode=='idf':
+        weights,default = idf_weights(ref_docs)
+    else:
+        weights,default = sif_weights(ref_docs,a)
+    pooling = {'mode':mode,'weights':weights,'default':default,'pc':None}
+    if mode=='sif':
+        vecs,mask = embed_docs(model,ref_docs,pooling)
+        pooling['pc'] = np.linalg.svd(vecs[mask],full_matrices=False)[2][0]
+    return pooling
+
+def save_pooling(pooling,path):
+    out = dict(pooling)
+    out['weights'] = dict((k,float(v)) for k,v in pooling['weights'].items())
+    out['default'] = float(pooling['default'])
+    out['pc'] = None if pooling['pc'] is None else [float(x) for x in pooling['pc']]
+    with codecs.open(path,'w',encoding='utf-8') as f:
+        json.dump(out,f,ensure_ascii=False)
+
+def load_pooling(path):
+    with codecs.open(path,'r',encoding='utf-8') as f:
+        pooling = json.load(f)
+    if pooling['pc'] is not None:
+        pooling['pc'] = np.array(pooling['pc'],dtype=np.float32)
+    return pooling
+
+def embed_docs(model,docs,pooling=None):
+    vecs = np.zeros((len(docs),model.vector_size),dtype=np.float32)
+    lengths = np.zeros(len(docs),dtype=np.int64)
+    idx = []
+    weights = []
+    for i,doc in enumerate(docs):
+        words = [word for word in doc if word in model.vocab]
+        idx.extend(model.vocab[word].index for word in words)
+        if pooling is not None:
+            weights.extend(pooling['weights'].get(word,pooling['default']) for word in words)
+        lengths[i] = len(words)
+    mask = lengths>0
+    if len(idx)==0:
+        return vecs,mask
+    # docs are contiguous runs of rows, so one reduceat pools the whole batch
+    starts = (np.cumsum(lengths)-lengths)[mask]
+    rows = np.asarray(model.vectors[idx],dtype=np.float32)
+    if pooling is None:
+        vecs[mask] = np.add.reduceat(rows,starts,axis=0)/lengths[mask][:,None]
+    else:
+        w = np.array(weights,dtype=np.float32)
+        vecs[mask] = np.add.reduceat(rows*w[:,None],starts,axis=0)/np.add.reduceat(w,starts)[:,None]
+        if pooling['pc'] is not None:
+            pc = pooling['pc']
+            vecs[mask] -= np.outer(vecs[mask].dot(pc),pc)
+    return vecs,mask
+
 def has_representation(model,doc):
     if len(doc)==0:
         return False
@@ -58,58 +134,100 @@ def regularize_sim(sims):
     LogInfo('Errors: '+str(errors))
     return r_sims
     
-def doc_sim(lang,docs1,docs2):
+MODEL_PATHS = {'cn':'../model/cn.cbow.bin',
+               'en':'../model/GoogleNews-vectors-negative300.bin'}
+STOPWORDS_PATHS = {'cn':'../data/chinese_stopwords.txt',
+                   'en':'../data/english_stopwords.txt'}
+PREPROCESS = {'cn':preprocess_data_cn,
+              'en':preprocess_data_en}
+
+def load_model(lang):
+    assert lang=='cn' or lang=='en', 'Language setting is wrong'
+    LogInfo('Load word2vec model...')
+    with instrument.span('model_load'):
+        model = KeyedVectors.load_word2vec_format(MODEL_PATHS[lang],binary=True,unicode_errors='ignore')
+        model.init_sims(replace=True)
+    return model
+
+def load_stopwords(lang):
+    assert lang=='cn' or lang=='en', 'Language setting is wrong'
+    return [w.strip() for w in codecs.open(STOPWORDS_PATHS[lang], 'r',encoding='utf-8').readlines()]
+
+def doc_sim(lang,docs1,docs2,model=None,pooling=None,stopwords=None):
     assert len(docs1)==len(docs2) ,'Documents number is not matched!'
     assert len(docs1)!=0,'Documents list1 is null'
     assert len(docs2)!=0,'Documents list2 is null'
     assert lang=='cn' or lang=='en', 'Language setting is wrong'
-    if lang=='cn':
-        model_path = '../model/cn.cbow.bin'
-        stopwords_path = '../data/chinese_stopwords.txt'
-        preprocess_data = preprocess_data_cn
-    elif lang=='en':
-        model_path = '../model/GoogleNews-vectors-negative300.bin'
-        stopwords_path = '../data/english_stopwords.txt'
-        preprocess_data = preprocess_data_en
-
-    LogInfo('Load word2vec model...')
-    model = KeyedVectors.load_word2vec_format(model_path,binary=True,unicode_errors='ignore')
-    model.init_sims(replace=True)
-    stopwords= [w.strip() for w in codecs.open(stopwords_path, 'r',encoding='utf-8').readlines()]
-    sims = []
+    preprocess_data = PREPROCESS[lang]
+    if model is None:
+        model = load_model(lang)
+    if stopwords is None:
+        stopwords = load_stopwords(lang)
     LogInfo('Calculating similarity...')
-    for i in range(len(docs1)):        
-        p1 = preprocess_data(stopwords,docs1[i])
-        p2 = preprocess_data(stopwords,docs2[i])
-        sim = calculate_similarity(model,p1,p2)
-        sims.append(sim)
+    if pooling is None:
+        sims = pair_sims(model,stopwords,preprocess_data,docs1,docs2)
+    else:
+        sims = batch_sims(model,stopwords,preprocess_data,docs1,docs2,pooling)
     r_sims = regularize_sim(sims)
     return r_sims
 
+def preprocess_pairs(stopwords,preprocess_data,docs1,docs2):
+    with instrument.span('preprocess'):
+        p1 = [preprocess_data(stopwords,doc) for doc in docs1]
+        p2 = [preprocess_data(stopwords,doc) for doc in docs2]
+    if instrument.ENABLED:
+        instrument.count('pairs',len(p1))
+        instrument.count('doc_tokens',sum(len(doc) for doc in p1)+sum(len(doc) for doc in p2))
+    return p1,p2
+
+def pair_sims(model,stopwords,preprocess_data,docs1,docs2):
+    p1,p2 = preprocess_pairs(stopwords,preprocess_data,docs1,docs2)
+    with instrument.span('similarity'):
+        sims = [calculate_similarity(model,p1[i],p2[i]) for i in range(len(p1))]
+    if instrument.ENABLED:
+        instrument.count('missing_representations',sims.count(-1))
+    return sims
+
+def batch_sims(model,stopwords,preprocess_data,docs1,docs2,pooling=None):
+    p1,p2 = preprocess_pairs(stopwords,preprocess_data,docs1,docs2)
+    with instrument.span('similarity'):
+        vecs1,mask1 = embed_docs(model,p1,pooling)
+        vecs2,mask2 = embed_docs(model,p2,pooling)
+        norms = np.linalg.norm(vecs1,axis=1)*np.linalg.norm(vecs2,axis=1)
+        valid = mask1 & mask2 & (norms>0)
+        cos = np.clip(np.sum(vecs1*vecs2,axis=1)[valid]/norms[valid],-1.0,1.0)
+        sims = np.full(len(docs1),-1.0)
+        sims[valid] = 1-np.arccos(cos)/np.pi
+    if instrument.ENABLED:
+        instrument.count('missing_representations',int(len(sims)-valid.sum()))
+    return list(sims)
+
+def compare_pooling(lang,data,ref_docs,model=None,modes=('mean','idf','sif')):
+    if model is None:
+        model = load_model(lang)
+    stopwords = load_stopwords(lang)
+    preprocess_data = PREPROCESS[lang]
+    ref_docs = [preprocess_data(stopwords,doc) for doc in ref_docs]
+    wer = np.asarray(data.WER.values,dtype=float)
+    rank = lambda x: np.argsort(np.argsort(x))
+    rows = []
+    for mode in modes:
+        pooling = build_pooling(model,ref_docs,mode)
+        start = time.time()
+        sims = regularize_sim(batch_sims(model,stopwords,preprocess_data,data.REF.values,data.HYP.values,pooling))
+        elapsed = time.time()-start
+        ser = 1-np.array(sims)
+        rows.append({'mode':mode,
+                     'pairs_per_sec':len(ser)/elapsed,
+                     'pearson':np.corrcoef(ser,wer)[0][1],
+                     'spearman':np.corrcoef(rank(ser),rank(wer))[0][1]})
+        LogInfo('%s: %.0f pairs/s, pearson %.4f, spearman %.4f' % (mode,rows[-1]['pairs_per_sec'],
+                rows[-1]['pearson'],rows[-1]['spearman']))
+    return pd.DataFrame(rows,columns=['mode','pairs_per_sec','pearson','spearman'])
+
 def main_cn():
-    corpus = ['baidu_003_02','weixin_003_02','ifly_003_02',
-              'baidu_008','weixin_008','ifly_008',
-              'baidu_006_01','weixin_006_01', 'ifly_006_01',
-              'baidu_004','weixin_004', 'ifly_004',
-              'baidu_004_02','weixin_004_02','ifly_004_02',
-               'baidu_rePunct_huiting','weixin_rePunct_huiting', 'ifly_rePunct_huiting']
-    for c in corpus:
-        LogInfo(c+' start')     
-        data = pd.read_text('../data/'+c+'.txt')
-        docs1 = data.REF.values
-        docs2 = data.HYP.values
-        sims = doc_sim('cn',docs1,docs2)
-        save_path = '../res/'+c+'_w2v09.txt'
-        res = pd.DataFrame(columns=['id','REF','HYP','semantic_similarity','SER','WER','difference'])
-        res.id = data.id
-        res.REF = docs1
-        res.HYP = docs2
-        res.WER = data.WER
-        res.semantic_similarity = sims  
-        res.SER = 1-res.semantic_similarity
-        res.difference = res.SER-res.WER
-        res.to_excel(save_path,index=0)
-        LogInfo(c+' finish')
+    from corpus_runner import run, default_manifest
+    run(default_manifest())
 
 def main_en():
     LogInfo('Start')